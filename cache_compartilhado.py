@@ -0,0 +1,411 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Backend do cache: "memoria" (por processo), "sqlite" (compartilhado no host) ou "redis"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memoria")
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))
+CACHE_PATH = os.getenv("CACHE_PATH", "/tmp/proxy_solis_cache.db")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Máximo de entradas no cache em memória (por worker)
+CACHE_MAX_ITENS = int(os.getenv("CACHE_MAX_ITENS", "1000"))
+# Validade do lock de single-flight (renovado enquanto a busca roda)
+CACHE_LOCK_TTL = float(os.getenv("CACHE_LOCK_TTL", "15"))
+# Espera máxima por outro worker; abaixo do --timeout do gunicorn (30 s por padrão)
+CACHE_ESPERA_MAX = float(os.getenv("CACHE_ESPERA_MAX", "20"))
+
+
+class EsperaEsgotada(Exception):
+    """Outro worker ainda está buscando a chave e o tempo de espera acabou."""
+
+
+class CacheBase:
+    """
+    Interface comum dos backends de cache. Valores são serializados em JSON
+    (exceto no cache em memória, que guarda os objetos e exige que sejam tratados como imutáveis).
+    obter_ou_buscar() garante que só um processo/thread busca uma chave por vez
+    (single-flight); os demais aguardam o resultado aparecer no cache.
+    """
+    # Validade do lock sem renovação. O dono renova a cada ttl_lock/3 enquanto busca,
+    # então uma busca lenta mantém o lock; se o dono morrer, ele expira neste prazo.
+    ttl_lock = CACHE_LOCK_TTL
+    # Espera máxima pelo resultado de outro worker. Deve ficar abaixo do --timeout do gunicorn (30 s).
+    espera_max = CACHE_ESPERA_MAX
+    intervalo_espera = 0.02
+    # True quando o backend guarda objetos Python (permite valores não serializáveis em JSON)
+    guarda_objetos = False
+    # False quando o lock não expira sozinho (não há o que renovar durante a busca)
+    renova_lock = True
+
+    def __init__(self, ttl=CACHE_TTL):
+        self.ttl = ttl
+
+    # --- Operações implementadas por cada backend ---
+    def _ler(self, chave):
+        raise NotImplementedError
+
+    def _gravar(self, chave, texto, ttl):
+        raise NotImplementedError
+
+    def _adquirir(self, chave, dono):
+        raise NotImplementedError
+
+    def _renovar(self, chave, dono):
+        raise NotImplementedError
+
+    def _liberar(self, chave, dono):
+        raise NotImplementedError
+
+    def _lock_ativo(self, chave):
+        raise NotImplementedError
+
+    def chaves(self, prefixo):
+        """Lista as chaves válidas que começam com 'prefixo'."""
+        raise NotImplementedError
+
+    # --- API pública ---
+    def _serializar(self, valor):
+        return json.dumps(valor)
+
+    def _desserializar(self, texto):
+        return json.loads(texto)
+
+    def get(self, chave):
+        texto = self._ler(chave)
+        return None if texto is None else self._desserializar(texto)
+
+    def set(self, chave, valor, ttl=None):
+        self._gravar(chave, self._serializar(valor), self.ttl if ttl is None else ttl)
+
+    def _buscar_com_lock(self, chave, dono, buscar, ttl, cacheavel):
+        """Executa a busca renovando o lock em segundo plano até ela terminar."""
+        fim = threading.Event()
+
+        def renovar():
+            while not fim.wait(self.ttl_lock / 3):
+                self._renovar(chave, dono)
+
+        if self.renova_lock:
+            threading.Thread(target=renovar, name="cache-renova-lock", daemon=True).start()
+        try:
+            valor = buscar()
+            if cacheavel is None or cacheavel(valor):
+                self.set(chave, valor, ttl)
+            return valor
+        finally:
+            fim.set()
+            self._liberar(chave, dono)
+
+    def obter_ou_buscar(self, chave, buscar, ttl=None, cacheavel=None):
+        """
+        Retorna (valor, origem), onde origem é "hit", "miss" ou "shared"
+        (resultado buscado por outro worker enquanto este esperava).
+        Levanta EsperaEsgotada se outro worker segurar a chave por mais de espera_max.
+
+        :param buscar: função sem argumentos que consulta a origem (Solis).
+        :param cacheavel: função opcional que decide se o valor pode ir para o cache.
+        """
+        valor = self.get(chave)
+        if valor is not None:
+            return valor, "hit"
+
+        dono = f"{os.getpid()}-{uuid.uuid4().hex}"
+        limite = time.monotonic() + self.espera_max
+        while not self._adquirir(chave, dono):
+            # Outro worker está buscando: espera o resultado ou o lock ser liberado
+            while True:
+                time.sleep(self.intervalo_espera)
+                valor = self.get(chave)
+                if valor is not None:
+                    return valor, "shared"
+                if time.monotonic() >= limite:
+                    raise EsperaEsgotada(chave)
+                if not self._lock_ativo(chave):
+                    # O dono terminou sem cachear (erro da Solis, resultado não cacheável): disputa o lock
+                    break
+
+        # Outro worker pode ter gravado entre o get() e o lock
+        valor = self.get(chave)
+        if valor is not None:
+            self._liberar(chave, dono)
+            return valor, "hit"
+        return self._buscar_com_lock(chave, dono, buscar, ttl, cacheavel), "miss"
+
+
+class CacheMemoria(CacheBase):
+    """
+    Cache local do processo. Cada worker do gunicorn tem o seu (não compartilhado).
+    Limitado a max_itens entradas (LRU); as vencidas saem na leitura ou pela ordem LRU.
+    """
+    guarda_objetos = True
+    # O lock é uma entrada local liberada no finally: dispensa a thread de renovação
+    renova_lock = False
+
+    def __init__(self, ttl=CACHE_TTL, max_itens=CACHE_MAX_ITENS):
+        super().__init__(ttl)
+        self.max_itens = max_itens
+        self._dados = OrderedDict()
+        self._locks = set()
+        self._mutex = threading.Lock()
+
+    def _serializar(self, valor):
+        return valor
+
+    def _desserializar(self, valor):
+        return valor
+
+    def _ler(self, chave):
+        with self._mutex:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            if item[1] < time.time():
+                del self._dados[chave]
+                return None
+            self._dados.move_to_end(chave)
+            return item[0]
+
+    def _gravar(self, chave, valor, ttl):
+        with self._mutex:
+            self._dados[chave] = (valor, time.time() + ttl)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_itens:
+                self._dados.popitem(last=False)
+
+    def _adquirir(self, chave, dono):
+        with self._mutex:
+            if chave in self._locks:
+                return False
+            self._locks.add(chave)
+            return True
+
+    def _renovar(self, chave, dono):
+        # Locks em memória não expiram: o dono sempre os libera no finally
+        pass
+
+    def _liberar(self, chave, dono):
+        with self._mutex:
+            self._locks.discard(chave)
+
+    def _lock_ativo(self, chave):
+        return chave in self._locks
+
+    def chaves(self, prefixo):
+        agora = time.time()
+        with self._mutex:
+            return [c for c, (_, expira) in self._dados.items() if c.startswith(prefixo) and expira >= agora]
+
+
+class CacheSQLite(CacheBase):
+    """
+    Cache em arquivo SQLite (modo WAL) compartilhado por todos os workers do mesmo host.
+    O lock de single-flight é uma linha na tabela 'locks' com expiração.
+    A cada limpar_a_cada gravações as entradas vencidas são apagadas.
+    """
+    limpar_a_cada = 200
+
+    def __init__(self, caminho=CACHE_PATH, ttl=CACHE_TTL):
+        super().__init__(ttl)
+        self.caminho = caminho
+        self._local = threading.local()
+        self._gravacoes = 0
+        conn = self._conexao()
+        conn.execute("CREATE TABLE IF NOT EXISTS cache (chave TEXT PRIMARY KEY, valor TEXT, expira REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS locks (chave TEXT PRIMARY KEY, dono TEXT, expira REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expira ON cache (expira)")
+
+    def _conexao(self):
+        # sqlite3 não permite compartilhar conexões entre threads: uma por thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _ler(self, chave):
+        linha = self._conexao().execute(
+            "SELECT valor FROM cache WHERE chave = ? AND expira >= ?", (chave, time.time())
+        ).fetchone()
+        return linha[0] if linha else None
+
+    def _gravar(self, chave, texto, ttl):
+        self._conexao().execute(
+            "INSERT OR REPLACE INTO cache (chave, valor, expira) VALUES (?, ?, ?)",
+            (chave, texto, time.time() + ttl),
+        )
+        self._gravacoes += 1
+        if self._gravacoes % self.limpar_a_cada == 0:
+            self.limpar_expirados()
+
+    def _adquirir(self, chave, dono):
+        conn = self._conexao()
+        agora = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM locks WHERE chave = ? AND expira < ?", (chave, agora))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO locks (chave, dono, expira) VALUES (?, ?, ?)",
+                (chave, dono, agora + self.ttl_lock),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.rowcount == 1
+
+    def _renovar(self, chave, dono):
+        self._conexao().execute(
+            "UPDATE locks SET expira = ? WHERE chave = ? AND dono = ?", (time.time() + self.ttl_lock, chave, dono)
+        )
+
+    def _liberar(self, chave, dono):
+        self._conexao().execute("DELETE FROM locks WHERE chave = ? AND dono = ?", (chave, dono))
+
+    def _lock_ativo(self, chave):
+        linha = self._conexao().execute(
+            "SELECT 1 FROM locks WHERE chave = ? AND expira >= ?", (chave, time.time())
+        ).fetchone()
+        return linha is not None
+
+    def chaves(self, prefixo):
+        linhas = self._conexao().execute(
+            "SELECT chave FROM cache WHERE substr(chave, 1, ?) = ? AND expira >= ?",
+            (len(prefixo), prefixo, time.time()),
+        ).fetchall()
+        return [linha[0] for linha in linhas]
+
+    def limpar_expirados(self):
+        """Remove entradas e locks vencidos (chamado automaticamente a cada limpar_a_cada gravações)."""
+        conn = self._conexao()
+        agora = time.time()
+        conn.execute("DELETE FROM cache WHERE expira < ?", (agora,))
+        conn.execute("DELETE FROM locks WHERE expira < ?", (agora,))
+
+
+class CacheRedis(CacheBase):
+    """
+    Cache em servidor compatível com o protocolo Redis (Redis, KeyDB, um stand-in local...).
+    Requer o pacote 'redis' (opcional, não está no requirements.txt).
+    As entradas expiram pelo próprio servidor (SET PX).
+    """
+    # Renova/libera o lock só se ele ainda pertence a quem chama (comparação atômica no servidor)
+    LUA_RENOVAR = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+    LUA_LIBERAR = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url=REDIS_URL, ttl=CACHE_TTL, prefixo="solis:"):
+        super().__init__(ttl)
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requer o pacote 'redis' (pip install redis).")
+        self._redis = redis.Redis.from_url(url)
+        self._script_renovar = self._redis.register_script(self.LUA_RENOVAR)
+        self._script_liberar = self._redis.register_script(self.LUA_LIBERAR)
+        self.prefixo = prefixo
+
+    def _ler(self, chave):
+        texto = self._redis.get(self.prefixo + chave)
+        return None if texto is None else texto.decode("utf-8")
+
+    def _gravar(self, chave, texto, ttl):
+        self._redis.set(self.prefixo + chave, texto, px=int(ttl * 1000))
+
+    def _adquirir(self, chave, dono):
+        return bool(self._redis.set(f"{self.prefixo}lock:{chave}", dono, nx=True, px=int(self.ttl_lock * 1000)))
+
+    def _renovar(self, chave, dono):
+        self._script_renovar(keys=[f"{self.prefixo}lock:{chave}"], args=[dono, int(self.ttl_lock * 1000)])
+
+    def _liberar(self, chave, dono):
+        self._script_liberar(keys=[f"{self.prefixo}lock:{chave}"], args=[dono])
+
+    def _lock_ativo(self, chave):
+        return bool(self._redis.exists(f"{self.prefixo}lock:{chave}"))
+
+    def chaves(self, prefixo):
+        inicio = len(self.prefixo)
+        return [c.decode("utf-8")[inicio:] for c in self._redis.scan_iter(match=f"{self.prefixo}{prefixo}*")]
+
+
+def criar_cache(backend=CACHE_BACKEND):
+    """Cria o backend de cache configurado em CACHE_BACKEND."""
+    if backend == "sqlite":
+        return CacheSQLite()
+    if backend == "redis":
+        return CacheRedis()
+    return CacheMemoria()
+
+
+# --- Benchmark (Executa se rodar o arquivo diretamente) ---
+def _worker_benchmark(backend, caminho, base_url, chaves, fila_resultado):
+    import urllib.request
+
+    cache = CacheSQLite(caminho) if backend == "sqlite" else CacheMemoria()
+    origens = {"hit": 0, "miss": 0, "shared": 0}
+    lock_origens = threading.Lock()
+
+    def consultar(person_id):
+        def buscar():
+            url = f"{base_url}/v1/financial/title?personId={person_id}&limit=100"
+            with urllib.request.urlopen(url) as resp:
+                return resp.read().decode("utf-8")
+        _, origem = cache.obter_ou_buscar(f"titulos:{person_id}", buscar)
+        with lock_origens:
+            origens[origem] += 1
+
+    # Simula as threads de um worker atendendo requisições em paralelo
+    threads = [threading.Thread(target=lambda bloco=chaves[i::4]: [consultar(c) for c in bloco]) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    fila_resultado.put(origens)
+
+
+def benchmark_cache(workers=4, requisicoes=2000, alunos=300, latencia=0.05):
+    """
+    Compara cache por processo e cache SQLite compartilhado entre N processos,
+    contando hit rate e chamadas ao fake_solis para a mesma carga.
+    """
+    import random
+    import tempfile
+    import multiprocessing
+    from fake_solis import iniciar_fake_solis
+
+    rng = random.Random(42)
+    # Distribuição concentrada: poucos alunos recebem a maior parte das consultas
+    carga = [str(int(alunos * rng.random() ** 3) + 1) for _ in range(requisicoes)]
+    ctx = multiprocessing.get_context("fork")
+
+    for backend in ("memoria", "sqlite"):
+        servidor, base_url, contador = iniciar_fake_solis(latencia=latencia)
+        caminho = os.path.join(tempfile.mkdtemp(), "cache.db")
+        CacheSQLite(caminho)  # cria as tabelas antes dos workers
+        fila = ctx.Queue()
+        inicio = time.perf_counter()
+        procs = [ctx.Process(target=_worker_benchmark, args=(backend, caminho, base_url, carga[i::workers], fila))
+                 for i in range(workers)]
+        for p in procs:
+            p.start()
+        totais = {"hit": 0, "miss": 0, "shared": 0}
+        for _ in procs:
+            for origem, qtd in fila.get().items():
+                totais[origem] += qtd
+        for p in procs:
+            p.join()
+        duracao = time.perf_counter() - inicio
+        servidor.shutdown()
+
+        aproveitadas = totais["hit"] + totais["shared"]
+        print(f"{backend:8} | workers: {workers} | hit rate: {aproveitadas / requisicoes:6.1%} "
+              f"| chamadas à Solis: {contador.total:5} | tempo: {duracao:.2f}s | {totais}")
+
+
+if __name__ == "__main__":
+    benchmark_cache()
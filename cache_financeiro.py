@@ -0,0 +1,283 @@
+import sys
+import json
+import zlib
+from array import array
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+# Formato de data usado pela API Solis (ex: 05/02/2025)
+FORMATO_DATA = '%d/%m/%Y'
+
+# Marca "sem valor compactado" nos arrays de inteiros (o original fica nos extras)
+SEM_VALOR = -2 ** 63
+
+def para_centavos(valor):
+    """Converte um valor monetário da Solis (string ou número) para centavos inteiros."""
+    if valor is None or valor == '':
+        return None
+    try:
+        return int((Decimal(str(valor)) * 100).to_integral_value())
+    except (InvalidOperation, ValueError, OverflowError):
+        return None
+
+
+def de_centavos(centavos):
+    """Converte centavos inteiros de volta para a string decimal que a Solis envia."""
+    if centavos is None:
+        return None
+    sinal = '-' if centavos < 0 else ''
+    inteiro, resto = divmod(abs(centavos), 100)
+    return f"{sinal}{inteiro}.{resto:02d}"
+
+
+def para_ordinal(data_str):
+    """Converte uma data 'dd/mm/aaaa' para o ordinal do calendário (0 se vazia/inválida)."""
+    if not data_str:
+        return 0
+    try:
+        return datetime.strptime(data_str, FORMATO_DATA).toordinal()
+    except (ValueError, TypeError):
+        return 0
+
+
+def de_ordinal(ordinal):
+    """Converte um ordinal de volta para 'dd/mm/aaaa'."""
+    if not ordinal:
+        return None
+    return date.fromordinal(ordinal).strftime(FORMATO_DATA)
+
+
+# --- Conversões exatas: só compactam se o valor volta idêntico; senão o original vai para os extras ---
+def _centavos_exato(valor):
+    if isinstance(valor, str):
+        centavos = para_centavos(valor)
+        if centavos is not None and -2 ** 62 < centavos < 2 ** 62 and de_centavos(centavos) == valor:
+            return centavos
+    return SEM_VALOR
+
+
+def _ordinal_exato(valor):
+    if isinstance(valor, str):
+        ordinal = para_ordinal(valor)
+        if ordinal and de_ordinal(ordinal) == valor:
+            return ordinal
+    return 0
+
+
+def _inteiro_exato(valor):
+    if type(valor) is int and -2 ** 62 < valor < 2 ** 62:
+        return valor
+    return SEM_VALOR
+
+
+def _texto_exato(valor):
+    # Códigos e descrições se repetem muito: internar faz todos apontarem para a mesma string
+    return sys.intern(valor) if isinstance(valor, str) else None
+
+
+def _identidade(valor):
+    return valor
+
+
+# (campo JSON, coluna, compactar, descompactar, marca de "não compactado")
+COLUNAS_TITULO = (
+    ('invoiceId', 'invoice_id', _inteiro_exato, _identidade, SEM_VALOR),
+    ('parcelNumber', 'parcel_number', _inteiro_exato, _identidade, SEM_VALOR),
+    ('maturityDate', 'maturity_date', _ordinal_exato, de_ordinal, 0),
+    ('nominalValue', 'nominal_value', _centavos_exato, de_centavos, SEM_VALOR),
+    ('balance', 'balance', _centavos_exato, de_centavos, SEM_VALOR),
+    ('isCanceled', 'is_canceled', _texto_exato, _identidade, None),
+)
+COLUNAS_LANCAMENTO = (
+    ('entryDate', 'entry_date', _ordinal_exato, de_ordinal, 0),
+    ('operationTypeId', 'operation_type_id', _texto_exato, _identidade, None),
+    ('operationDescription', 'operation_description', _texto_exato, _identidade, None),
+    ('value', 'value', _centavos_exato, de_centavos, SEM_VALOR),
+)
+
+
+class TitulosCompactos:
+    """
+    Títulos financeiros de um aluno em formato colunar para o cache em memória.
+    Valores em centavos (array 'q'), datas como ordinais (array 'i'), códigos e
+    descrições internados e os comentários de todos os lançamentos num único
+    bloco zlib, decodificado só quando o JSON é reconstruído.
+
+    A conversão não perde dados: valores que não voltariam idênticos (outro
+    formato de data, número em vez de string) e campos desconhecidos ficam
+    guardados como vieram, e chaves ausentes continuam ausentes.
+    """
+    __slots__ = ('envelope', 'invoice_id', 'parcel_number', 'maturity_date', 'nominal_value', 'balance',
+                 'is_canceled', 'offsets', 'extras_titulo', 'entry_date', 'operation_type_id',
+                 'operation_description', 'value', 'extras_lancamento', 'comentarios')
+
+    def __init__(self, titulos, envelope=None):
+        # Demais chaves da resposta da Solis quando ela vem como {"items": [...], ...}
+        self.envelope = envelope
+        self.invoice_id = array('q')
+        self.parcel_number = array('q')
+        self.maturity_date = array('i')
+        self.nominal_value = array('q')
+        self.balance = array('q')
+        self.is_canceled = []
+        # offsets[i]:offsets[i+1] são os lançamentos do título i; -1 = 'lancamentos' não compactado
+        self.offsets = array('i', [0])
+        self.entry_date = array('i')
+        self.operation_type_id = []
+        self.operation_description = []
+        self.value = array('q')
+        # Extras esparsos: índice -> campos guardados como vieram
+        self.extras_titulo = {}
+        self.extras_lancamento = {}
+        comentarios = []
+
+        for i, titulo in enumerate(titulos):
+            extras = self._compactar(titulo, COLUNAS_TITULO)
+            lancamentos = titulo.get('lancamentos')
+            if isinstance(lancamentos, list) and all(isinstance(l, dict) for l in lancamentos):
+                del extras['lancamentos']
+                for lanc in lancamentos:
+                    extras_lanc = self._compactar(lanc, COLUNAS_LANCAMENTO)
+                    comentario = lanc.get('comments')
+                    if isinstance(comentario, str):
+                        del extras_lanc['comments']
+                        comentarios.append(comentario)
+                    else:
+                        comentarios.append(None)
+                    if extras_lanc:
+                        self.extras_lancamento[len(self.value) - 1] = extras_lanc
+                fim = len(self.value)
+            else:
+                fim = -1
+            self.offsets.append(fim)
+            if extras:
+                self.extras_titulo[i] = extras
+
+        self.comentarios = zlib.compress(json.dumps(comentarios, ensure_ascii=False).encode('utf-8'))
+
+    def _compactar(self, origem, colunas):
+        """Grava os campos conhecidos nas colunas e retorna o que precisou ficar como veio."""
+        extras = dict(origem)
+        for campo, coluna, compactar, _, vazio in colunas:
+            valor = compactar(origem[campo]) if campo in origem else vazio
+            getattr(self, coluna).append(valor)
+            if valor is not vazio and valor != vazio:
+                del extras[campo]
+        return extras
+
+    def _montar(self, indice, colunas, extras):
+        registro = {}
+        for campo, coluna, _, descompactar, vazio in colunas:
+            valor = getattr(self, coluna)[indice]
+            if valor is not vazio and valor != vazio:
+                registro[campo] = descompactar(valor)
+            elif extras and campo in extras:
+                registro[campo] = extras[campo]
+        return registro
+
+    def __len__(self):
+        return len(self.invoice_id)
+
+    def to_list(self):
+        """Reconstrói a lista de títulos no formato JSON da Solis."""
+        comentarios = json.loads(zlib.decompress(self.comentarios).decode('utf-8'))
+        titulos = []
+        inicio = 0
+        for i in range(len(self)):
+            extras = self.extras_titulo.get(i)
+            titulo = self._montar(i, COLUNAS_TITULO, extras)
+            fim = self.offsets[i + 1]
+            if fim >= 0:
+                lancamentos = []
+                for j in range(inicio, fim):
+                    extras_lanc = self.extras_lancamento.get(j)
+                    lanc = self._montar(j, COLUNAS_LANCAMENTO, extras_lanc)
+                    if comentarios[j] is not None:
+                        lanc['comments'] = comentarios[j]
+                    if extras_lanc:
+                        for chave, valor in extras_lanc.items():
+                            lanc.setdefault(chave, valor)
+                    lancamentos.append(lanc)
+                titulo['lancamentos'] = lancamentos
+                inicio = fim
+            if extras:
+                for chave, valor in extras.items():
+                    titulo.setdefault(chave, valor)
+            titulos.append(titulo)
+        return titulos
+
+    def to_json(self):
+        """Corpo JSON equivalente à resposta original da Solis (lista ou envelope com 'items')."""
+        titulos = self.to_list()
+        if self.envelope is not None:
+            return json.dumps(dict(self.envelope, items=titulos), ensure_ascii=False)
+        return json.dumps(titulos, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, texto):
+        """
+        Compacta o corpo de resposta da Solis para títulos financeiros.
+        Retorna None se o formato não for o esperado (o chamador guarda o texto como veio).
+        """
+        try:
+            dados = json.loads(texto)
+        except ValueError:
+            return None
+        envelope = None
+        if isinstance(dados, dict) and isinstance(dados.get('items'), list):
+            envelope = {k: v for k, v in dados.items() if k != 'items'}
+            dados = dados['items']
+        if not isinstance(dados, list) or not all(isinstance(t, dict) for t in dados):
+            return None
+        return cls(dados, envelope)
+
+
+def compactar_titulos(titulos):
+    """Converte a lista de títulos da Solis (dicts) para a forma compacta."""
+    return TitulosCompactos(titulos or ())
+
+
+def expandir_titulos(titulos_compactos):
+    """Converte títulos compactos de volta para a lista de dicts JSON."""
+    return titulos_compactos.to_list()
+
+
+# --- Benchmark de Memória (Executa se rodar o arquivo diretamente) ---
+def benchmark_memoria(qtd_alunos=2000, titulos_por_aluno=24):
+    """
+    Compara alunos/MB entre as formas de guardar os títulos no cache: dicts
+    decodificados, o texto JSON da resposta (o que o cache guarda sem este
+    modelo) e TitulosCompactos.
+    """
+    import tracemalloc
+    from fake_solis import gerar_titulos_sinteticos
+
+    payloads = [json.dumps({"items": gerar_titulos_sinteticos(pid, titulos_por_aluno)}) for pid in range(qtd_alunos)]
+
+    def medir(construir):
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        cache = {pid: construir(p) for pid, p in enumerate(payloads)}
+        usado = tracemalloc.get_traced_memory()[0] - base
+        tracemalloc.stop()
+        return cache, usado
+
+    # Cópias dos textos (os originais em payloads não entram na medição)
+    cache_texto, bytes_texto = medir(lambda p: (p + ' ')[:-1])
+    cache_dict, bytes_dict = medir(json.loads)
+    cache_compacto, bytes_compacto = medir(TitulosCompactos.from_json)
+
+    # A conversão de volta precisa reproduzir exatamente a resposta original
+    for pid in range(0, qtd_alunos, max(qtd_alunos // 50, 1)):
+        assert json.loads(cache_compacto[pid].to_json()) == cache_dict[pid]
+
+    mb = 1024 * 1024
+    print(f"Alunos: {qtd_alunos} | Títulos por aluno: {titulos_por_aluno}")
+    for nome, usado in (("Dict", bytes_dict), ("Texto JSON", bytes_texto), ("Compacto", bytes_compacto)):
+        print(f"{nome:11} {usado / mb:8.2f} MB | {usado / qtd_alunos / 1024:6.1f} KB/aluno "
+              f"| {qtd_alunos / (usado / mb):8.1f} alunos/MB")
+    print(f"Compacto vs texto JSON: {bytes_texto / bytes_compacto:.1f}x menos memória")
+
+
+if __name__ == "__main__":
+    benchmark_memoria()
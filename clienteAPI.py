@@ -1,9 +1,12 @@
+import time
 import requests
 import json
 import logging
+from log_estruturado import configurar_logging
 
-# Configuração básica de logs para facilitar a depuração no VS Code
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Logs estruturados (JSON) escritos por uma thread em segundo plano
+configurar_logging()
+logger = logging.getLogger(__name__)
 
 class SolisAPIClient:
     """
@@ -30,14 +33,16 @@ class SolisAPIClient:
         Método interno genérico para fazer requisições GET.
         """
         url = f"{self.base_url}{endpoint}"
+        inicio = time.perf_counter()
+        response = None
         try:
-            logging.info(f"Consultando endpoint: {url} | Params: {params}")
             response = requests.get(url, headers=self.headers, params=params, timeout=10)
             
             # Verifica se a resposta foi bem-sucedida (200 OK)
             response.raise_for_status()
             
             data = response.json()
+            logger.info("Consulta Solis", extra=self._campos_log(endpoint, params, inicio, response))
             
             # A API Solis geralmente retorna listas dentro de uma chave 'items', mas às vezes retorna a lista direta.
             # Esta lógica normaliza o retorno para sempre ser uma lista ou dicionário limpo.
@@ -46,18 +51,31 @@ class SolisAPIClient:
             return data
 
         except requests.exceptions.HTTPError as err:
-            logging.error(f"Erro HTTP ao acessar Solis: {err}. Status: {response.status_code}. Resposta: {response.text}")
+            logger.error("Erro HTTP ao acessar Solis: %s. Resposta: %s", err, response.text[:500],
+                         extra=self._campos_log(endpoint, params, inicio, response))
             return None
         except requests.exceptions.ConnectionError:
-            logging.error("Erro de Conexão: Não foi possível conectar ao servidor da Solis.")
+            logger.error("Erro de Conexão: Não foi possível conectar ao servidor da Solis.",
+                         extra=self._campos_log(endpoint, params, inicio))
             return None
         except requests.exceptions.Timeout:
-            logging.error("Erro de Timeout: A API demorou muito para responder.")
+            logger.error("Erro de Timeout: A API demorou muito para responder.",
+                         extra=self._campos_log(endpoint, params, inicio))
             return None
         except Exception as e:
-            logging.error(f"Erro inesperado: {e}")
+            logger.error("Erro inesperado: %s", e, extra=self._campos_log(endpoint, params, inicio, response))
             return None
 
+    @staticmethod
+    def _campos_log(endpoint, params, inicio, response=None):
+        """Campos estruturados de uma chamada à Solis (params são mascarados pelo formatter)."""
+        return {
+            "upstream": endpoint,
+            "params": params,
+            "status": response.status_code if response is not None else None,
+            "duration_ms": round((time.perf_counter() - inicio) * 1000, 1),
+        }
+
     def consultar_pessoa(self, termo_busca):
         """
         Busca uma pessoa por Nome, CPF ou ID.
@@ -109,6 +127,36 @@ class SolisAPIClient:
             
         return titulos
 
+    def buscar_contratos(self, person_id):
+        """
+        Retorna os contratos acadêmicos do aluno, ou None se a consulta falhar.
+        Diferente de consultar_dados_contrato, não confunde erro com "sem contratos".
+        
+        :param person_id: ID numérico da pessoa no sistema.
+        """
+        contratos = self._make_request("/v1/academic/contract", {"personId": person_id})
+        return contratos if isinstance(contratos, list) else None
+
+    def buscar_titulos_pagina(self, person_id, limit=100, offset=0, order="maturityDate:asc"):
+        """
+        Retorna uma página dos títulos financeiros do aluno, ou None se a consulta falhar.
+        Usado por quem precisa de todo o histórico (ex: exportação da carteira),
+        sem o limite de 100 títulos recentes de consultar_financeiro_aluno.
+        
+        :param person_id: ID numérico da pessoa no sistema.
+        :param limit: Tamanho da página.
+        :param offset: Quantos títulos pular.
+        :param order: Ordenação da Solis (campo:asc|desc).
+        """
+        params = {
+            "personId": person_id,
+            "limit": limit,
+            "offset": offset,
+            "order": order,
+        }
+        titulos = self._make_request("/v1/financial/title", params)
+        return titulos if isinstance(titulos, list) else None
+
 # --- Bloco de Teste Rápido (Executa se rodar o arquivo diretamente no VS Code) ---
 if __name__ == "__main__":
     import os
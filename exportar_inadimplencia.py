@@ -0,0 +1,309 @@
+import os
+import sys
+import csv
+import time
+import argparse
+from bisect import bisect_left
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from clienteAPI import SolisAPIClient
+from cache_financeiro import para_centavos, para_ordinal, de_centavos, de_ordinal
+
+# Limites (em dias após o maturityDate) de cada faixa de atraso
+LIMITES_FAIXAS = (30, 60, 90)
+FAIXAS = ("0-30", "31-60", "61-90", "90+")
+# Saldo em aberto que ainda não venceu fica numa coluna separada no resumo
+FAIXA_A_VENCER = "a_vencer"
+
+# A exportação pagina os títulos em vez de usar o limite de 100 da consulta da tela
+TAMANHO_PAGINA = 100
+
+COLUNAS = ("person_id", "curso", "invoice_id", "parcela", "vencimento", "saldo", "dias_atraso", "faixa")
+
+
+def _novo_lote():
+    return {"person_id": [], "curso": [], "invoice_id": [], "parcela": [], "vencimento": [], "saldo": []}
+
+
+def buscar_titulos(cliente, person_id):
+    """
+    Busca todos os títulos do aluno, página a página (limit/offset).
+    Retorna None se alguma página falhar, para não confundir erro com "sem títulos".
+    """
+    titulos = []
+    offset = 0
+    while True:
+        pagina = cliente.buscar_titulos_pagina(person_id, limit=TAMANHO_PAGINA, offset=offset)
+        if pagina is None:
+            return None
+        if offset and pagina and pagina[0] == titulos[offset - TAMANHO_PAGINA]:
+            # A API ignorou o offset: não dá para garantir que a lista está completa
+            return None
+        titulos.extend(pagina)
+        if len(pagina) < TAMANHO_PAGINA:
+            return titulos
+        offset += TAMANHO_PAGINA
+
+
+def buscar_aluno(cliente, person_id):
+    """Retorna (person_id, curso, titulos); curso e titulos são None se a consulta falhou."""
+    contratos = cliente.buscar_contratos(person_id)
+    if contratos is None:
+        return person_id, None, None
+    curso = contratos[0].get('courseName') if contratos else None
+    return person_id, curso or "Sem contrato", buscar_titulos(cliente, person_id)
+
+
+def iterar_lotes(cliente, person_ids, tamanho_lote=5000, workers=4, falhas=None):
+    """
+    Busca contratos e títulos de cada aluno e gera lotes em formato de colunas.
+    Apenas títulos não cancelados com saldo positivo entram no lote.
+    Alunos cuja consulta falhou não entram nos lotes e são adicionados a 'falhas'.
+    A memória fica limitada a um lote mais os alunos em voo nas threads.
+    """
+    def buscar(person_id):
+        return buscar_aluno(cliente, person_id)
+
+    lote = _novo_lote()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Submete em blocos para não enfileirar todos os alunos de uma vez
+        person_ids = iter(person_ids)
+        while True:
+            bloco = [pid for _, pid in zip(range(workers * 8), person_ids)]
+            if not bloco:
+                break
+            for person_id, curso, titulos in executor.map(buscar, bloco):
+                if titulos is None:
+                    if falhas is not None:
+                        falhas.append(person_id)
+                    continue
+                for titulo in titulos:
+                    saldo = para_centavos(titulo.get('balance'))
+                    if not saldo or saldo <= 0 or titulo.get('isCanceled') == 'SIM':
+                        continue
+                    lote["person_id"].append(person_id)
+                    lote["curso"].append(curso)
+                    lote["invoice_id"].append(titulo.get('invoiceId'))
+                    lote["parcela"].append(titulo.get('parcelNumber'))
+                    lote["vencimento"].append(para_ordinal(titulo.get('maturityDate')))
+                    lote["saldo"].append(saldo)
+                if len(lote["saldo"]) >= tamanho_lote:
+                    yield lote
+                    lote = _novo_lote()
+    if lote["saldo"]:
+        yield lote
+
+
+def calcular_faixas(lote, hoje_ordinal):
+    """
+    Calcula dias de atraso e faixa para o lote inteiro, coluna a coluna.
+    Títulos sem data de vencimento válida são tratados como a vencer.
+    """
+    dias = [hoje_ordinal - v if v else 0 for v in lote["vencimento"]]
+    lote["dias_atraso"] = dias
+    lote["faixa"] = [FAIXAS[bisect_left(LIMITES_FAIXAS, d)] if d > 0 else FAIXA_A_VENCER for d in dias]
+    return lote
+
+
+class ResumoCarteira:
+    """Acumula saldos em centavos por curso e faixa de atraso."""
+
+    def __init__(self):
+        self.por_curso = {}
+        self.total = dict.fromkeys(FAIXAS + (FAIXA_A_VENCER,), 0)
+        self.titulos = 0
+        # IDs dos alunos que não puderam ser consultados (totais incompletos se houver algum)
+        self.falhas = []
+
+    def acumular(self, lote):
+        for curso, faixa, saldo in zip(lote["curso"], lote["faixa"], lote["saldo"]):
+            linha = self.por_curso.get(curso)
+            if linha is None:
+                linha = self.por_curso[curso] = dict.fromkeys(FAIXAS + (FAIXA_A_VENCER,), 0)
+            linha[faixa] += saldo
+            self.total[faixa] += saldo
+        self.titulos += len(lote["saldo"])
+
+    def linhas(self):
+        """Retorna as linhas do resumo (uma por curso mais o total), valores em reais."""
+        colunas = FAIXAS + (FAIXA_A_VENCER,)
+        for curso in sorted(self.por_curso) + ["TOTAL"]:
+            valores = self.total if curso == "TOTAL" else self.por_curso[curso]
+            vencido = sum(valores[f] for f in FAIXAS)
+            yield [curso] + [de_centavos(valores[f]) for f in colunas] + [de_centavos(vencido)]
+
+    def escrever_csv(self, caminho):
+        with open(caminho, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["curso"] + list(FAIXAS) + [FAIXA_A_VENCER, "total_vencido"])
+            writer.writerows(self.linhas())
+            if self.falhas:
+                writer.writerow([f"INCOMPLETO: {len(self.falhas)} alunos não puderam ser consultados"])
+
+    def escrever_falhas(self, caminho):
+        with open(caminho, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["person_id"])
+            writer.writerows([pid] for pid in self.falhas)
+
+
+class EscritorCSV:
+    """Escreve os lotes num CSV de forma incremental."""
+
+    def __init__(self, caminho):
+        self._arquivo = open(caminho, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._arquivo)
+        self._writer.writerow(COLUNAS)
+
+    def escrever(self, lote):
+        self._writer.writerows(zip(
+            lote["person_id"], lote["curso"], lote["invoice_id"], lote["parcela"],
+            map(de_ordinal, lote["vencimento"]), map(de_centavos, lote["saldo"]),
+            lote["dias_atraso"], lote["faixa"],
+        ))
+
+    def fechar(self):
+        self._arquivo.close()
+
+
+class EscritorParquet:
+    """
+    Escreve os lotes num arquivo Parquet, um row group por lote.
+    Requer pyarrow (opcional, não está no requirements.txt).
+    """
+
+    def __init__(self, caminho):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Exportação em Parquet requer o pacote 'pyarrow' (pip install pyarrow).")
+        self._pa = pa
+        self._schema = pa.schema([
+            ("person_id", pa.string()), ("curso", pa.string()), ("invoice_id", pa.string()),
+            ("parcela", pa.string()), ("vencimento", pa.date32()), ("saldo_centavos", pa.int64()),
+            ("dias_atraso", pa.int32()), ("faixa", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(caminho, self._schema)
+
+    def escrever(self, lote):
+        pa = self._pa
+        # date32 conta dias desde 1970-01-01 (ordinal 719163)
+        epoca = 719163
+        tabela = pa.table([
+            pa.array([str(v) for v in lote["person_id"]]),
+            pa.array(lote["curso"]),
+            pa.array([None if v is None else str(v) for v in lote["invoice_id"]]),
+            pa.array([None if v is None else str(v) for v in lote["parcela"]]),
+            pa.array([v - epoca if v else None for v in lote["vencimento"]], type=pa.date32()),
+            pa.array(lote["saldo"], type=pa.int64()),
+            pa.array(lote["dias_atraso"], type=pa.int32()),
+            pa.array(lote["faixa"]),
+        ], schema=self._schema)
+        self._writer.write_table(tabela)
+
+    def fechar(self):
+        self._writer.close()
+
+
+def exportar_carteira(cliente, person_ids, caminho_saida, formato="csv", caminho_resumo=None,
+                      tamanho_lote=5000, workers=4, hoje=None, caminho_falhas=None):
+    """
+    Exporta o saldo em aberto de todos os alunos informados, com faixa de atraso.
+    Retorna o ResumoCarteira acumulado (e grava em caminho_resumo se informado).
+    Os alunos que falharam ficam em resumo.falhas (e em caminho_falhas, se houver algum).
+    """
+    hoje_ordinal = (hoje or datetime.now().date()).toordinal()
+    escritor = EscritorParquet(caminho_saida) if formato == "parquet" else EscritorCSV(caminho_saida)
+    resumo = ResumoCarteira()
+    try:
+        for lote in iterar_lotes(cliente, person_ids, tamanho_lote, workers, resumo.falhas):
+            calcular_faixas(lote, hoje_ordinal)
+            escritor.escrever(lote)
+            resumo.acumular(lote)
+    finally:
+        escritor.fechar()
+    if caminho_resumo:
+        resumo.escrever_csv(caminho_resumo)
+    if caminho_falhas and resumo.falhas:
+        resumo.escrever_falhas(caminho_falhas)
+    return resumo
+
+
+def ler_ids(caminho):
+    """Lê IDs de alunos de um arquivo texto (um por linha), sem carregar tudo na memória."""
+    with open(caminho, encoding='utf-8') as f:
+        for linha in f:
+            linha = linha.strip()
+            if linha.isdigit():
+                yield linha
+
+
+def benchmark_exportacao(total_titulos=50000, titulos_por_aluno=24, formato="csv"):
+    """Exporta ~total_titulos títulos sintéticos servidos pelo fake_solis local."""
+    import tempfile
+    from fake_solis import iniciar_fake_solis
+
+    servidor, base_url, contador = iniciar_fake_solis(titulos_por_aluno=titulos_por_aluno)
+    qtd_alunos = -(-total_titulos // titulos_por_aluno)
+    cliente = SolisAPIClient(base_url, "token-falso")
+    pasta = tempfile.mkdtemp()
+    try:
+        inicio = time.perf_counter()
+        resumo = exportar_carteira(
+            cliente, range(1, qtd_alunos + 1), os.path.join(pasta, f"carteira.{formato}"),
+            formato=formato, caminho_resumo=os.path.join(pasta, "resumo.csv"),
+        )
+        duracao = time.perf_counter() - inicio
+    finally:
+        servidor.shutdown()
+
+    print(f"Alunos: {qtd_alunos} | Títulos gerados: {qtd_alunos * titulos_por_aluno} "
+          f"| Em aberto: {resumo.titulos} | Falhas: {len(resumo.falhas)}")
+    print(f"Chamadas à Solis: {contador.total} | Tempo: {duracao:.2f}s | {qtd_alunos * titulos_por_aluno / duracao:,.0f} títulos/s")
+    print(f"Arquivos em: {pasta}")
+    for linha in resumo.linhas():
+        print("   " + " | ".join(str(v) for v in linha))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta a inadimplência da carteira por faixa de atraso.")
+    parser.add_argument("ids", nargs="?", help="Arquivo com um ID de aluno por linha")
+    parser.add_argument("--saida", default="carteira.csv", help="Arquivo de saída (CSV ou Parquet)")
+    parser.add_argument("--formato", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--resumo", default="resumo_carteira.csv", help="Arquivo CSV com o resumo por curso")
+    parser.add_argument("--falhas", default="falhas_carteira.csv", help="Arquivo CSV com os alunos que falharam")
+    parser.add_argument("--workers", type=int, default=4, help="Consultas simultâneas à Solis")
+    parser.add_argument("--benchmark", action="store_true", help="Roda contra o fake_solis com 50k títulos")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_exportacao(formato=args.formato)
+        return
+    if not args.ids:
+        parser.error("Informe o arquivo de IDs ou use --benchmark.")
+
+    load_dotenv()
+    api_url = os.getenv("SOLIS_API_URL")
+    jwt_token = os.getenv("SOLIS_JWT_TOKEN")
+    if not api_url or not jwt_token:
+        print("❌ ERRO: Defina SOLIS_API_URL e SOLIS_JWT_TOKEN no ficheiro .env")
+        return
+
+    print("--- 🚀 Iniciando Exportação da Carteira ---")
+    resumo = exportar_carteira(
+        SolisAPIClient(api_url, jwt_token), ler_ids(args.ids), args.saida,
+        formato=args.formato, caminho_resumo=args.resumo, workers=args.workers,
+        caminho_falhas=args.falhas,
+    )
+    print(f"✅ {resumo.titulos} títulos em aberto exportados para {args.saida}")
+    print(f"📄 Resumo por curso gravado em {args.resumo}")
+    if resumo.falhas:
+        print(f"⚠️  ATENÇÃO: {len(resumo.falhas)} alunos não puderam ser consultados; os totais estão INCOMPLETOS.")
+        print(f"   IDs gravados em {args.falhas}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
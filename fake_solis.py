@@ -0,0 +1,144 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from datetime import date
+
+# Formato de data usado pela API Solis (ex: 05/02/2025)
+FORMATO_DATA = '%d/%m/%Y'
+
+# Cursos usados para distribuir os alunos sintéticos
+CURSOS = ["Administração", "Direito", "Enfermagem", "Pedagogia", "Psicologia"]
+
+
+def gerar_titulos_sinteticos(person_id, quantidade=24, hoje=None):
+    """
+    Gera títulos no formato da Solis para testes e benchmarks.
+    Os vencimentos são mensais e terminam perto de 'hoje' (com uma variação por aluno),
+    para que os títulos em aberto caiam em todas as faixas de atraso e alguns ainda a vencer.
+    """
+    hoje = hoje or date.today()
+    primeiro = hoje.toordinal() - 30 * (quantidade - 3) - person_id % 30
+    titulos = []
+    for i in range(quantidade):
+        vencimento = primeiro + 30 * i
+        valor = f"{850 + (person_id % 7) * 10}.{i % 100:02d}"
+        # Os 5 últimos ficam em aberto (cobrem 61-90, 31-60, 0-30 e a vencer); os antigos, um a cada três
+        pago = i % 3 != 0 and i < quantidade - 5
+        lancamentos = [{
+            'entryDate': date.fromordinal(vencimento - 5).strftime(FORMATO_DATA),
+            'operationTypeId': 'D',
+            'operationDescription': 'MENSALIDADE',
+            'value': valor,
+            'comments': f"<p>Mensalidade referente à parcela <b>{i + 1}</b> do contrato do aluno {person_id}.</p>",
+        }]
+        if pago:
+            lancamentos.append({
+                'entryDate': date.fromordinal(vencimento).strftime(FORMATO_DATA),
+                'operationTypeId': 'C',
+                'operationDescription': 'PAGAMENTO BOLETO',
+                'value': valor,
+                'comments': '',
+            })
+        titulos.append({
+            'invoiceId': person_id * 1000 + i,
+            'parcelNumber': i + 1,
+            'maturityDate': date.fromordinal(vencimento).strftime(FORMATO_DATA),
+            'nominalValue': valor,
+            'balance': '0.00' if pago else valor,
+            'isCanceled': 'NÃO',
+            'lancamentos': lancamentos,
+        })
+    return titulos
+
+
+class FakeSolisHandler(BaseHTTPRequestHandler):
+    """
+    Servidor local que imita os endpoints da Solis usados pelo proxy.
+    Serve apenas para testes e benchmarks (nenhum dado real).
+    """
+    titulos_por_aluno = 24
+    latencia = 0.0
+    contador_chamadas = None
+
+    def log_message(self, format, *args):
+        # Silencia o log padrão do http.server
+        pass
+
+    def _responder(self, status, corpo):
+        payload = json.dumps(corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.latencia:
+            threading.Event().wait(self.latencia)
+        if self.contador_chamadas is not None:
+            self.contador_chamadas.incrementar()
+
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        person_id = int(params.get('personId', 0) or 0)
+
+        if url.path == "/v1/academic/contract":
+            self._responder(200, {"items": [{
+                "contractId": person_id,
+                "personName": f"Aluno {person_id}",
+                "courseName": CURSOS[person_id % len(CURSOS)],
+                "courseVersion": "2024/1",
+            }]})
+        elif url.path == "/v1/financial/title":
+            limite = int(params.get('limit', self.titulos_por_aluno))
+            offset = int(params.get('offset', 0))
+            titulos = gerar_titulos_sinteticos(person_id, self.titulos_por_aluno)
+            self._responder(200, {"items": titulos[offset:offset + limite]})
+        elif url.path.startswith("/api/basico/relatorio-generico/gerar/"):
+            tamanho = int(self.headers.get('Content-Length') or 0)
+            corpo = json.loads(self.rfile.read(tamanho) or b'{}')
+            par = corpo.get('par', {})
+            identificador = par.get('cpf') or par.get('cod') or par.get('nome') or '0'
+            self._responder(200, [{"identificador": identificador, "nome": f"Aluno {identificador}"}])
+        else:
+            self._responder(404, {"error": "Endpoint não simulado"})
+
+
+class ContadorChamadas:
+    """Contador thread-safe de chamadas recebidas pelo servidor falso."""
+
+    def __init__(self):
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def incrementar(self):
+        with self._lock:
+            self.total += 1
+
+
+def iniciar_fake_solis(porta=0, titulos_por_aluno=24, latencia=0.0):
+    """
+    Sobe o servidor falso numa thread em segundo plano.
+    Retorna (servidor, base_url, contador). Use servidor.shutdown() para encerrar.
+    """
+    contador = ContadorChamadas()
+    handler = type("Handler", (FakeSolisHandler,), {
+        "titulos_por_aluno": titulos_por_aluno,
+        "latencia": latencia,
+        "contador_chamadas": contador,
+    })
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}", contador
+
+
+if __name__ == "__main__":
+    servidor, base_url, _ = iniciar_fake_solis(porta=8099)
+    print(f"--- 🧪 Fake Solis rodando em {base_url} (Ctrl+C para sair) ---")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        servidor.shutdown()
@@ -0,0 +1,142 @@
+import os
+import re
+import sys
+import json
+import queue
+import atexit
+import random
+import threading
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+# Taxa de amostragem dos acessos bem-sucedidos (0.0 a 1.0). Erros e lentos são sempre mantidos.
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+# Requisições acima deste tempo (ms) são sempre registradas
+LOG_SLOW_MS = float(os.getenv("LOG_SLOW_MS", "1000"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Tamanho máximo da fila de logs; com ela cheia os registros novos são descartados
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+
+# CPF com ou sem pontuação (mantém só os dígitos verificadores)
+RE_CPF = re.compile(r'\b\d{3}\.?\d{3}\.?\d{3}-?(\d{2})\b')
+# Tokens JWT (três blocos base64url começando com eyJ)
+RE_JWT = re.compile(r'eyJ[\w-]+\.[\w-]+\.[\w-]+')
+# Chaves cujos valores nunca devem aparecer no log
+CHAVES_SENSIVEIS = {"x-token", "token", "jwt", "authorization", "cpf"}
+
+# Atributos padrão do LogRecord; o resto veio de extra=... e vira campo do JSON
+_ATRIBUTOS_PADRAO = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+def mascarar(valor):
+    """Mascara CPFs e tokens em strings, dicts e listas (recursivo)."""
+    if isinstance(valor, str):
+        return RE_JWT.sub("***", RE_CPF.sub(r"***.***.***-\1", valor))
+    if isinstance(valor, dict):
+        return {k: "***" if str(k).lower() in CHAVES_SENSIVEIS else mascarar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [mascarar(v) for v in valor]
+    return valor
+
+
+class JSONFormatter(logging.Formatter):
+    """Formata cada registro como uma linha JSON com os campos passados em extra=..."""
+
+    def format(self, record):
+        dados = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO:
+                dados[chave] = valor
+        if record.exc_info:
+            dados["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            dados["exc"] = record.exc_text
+        return json.dumps(mascarar(dados), ensure_ascii=False, default=str)
+
+
+class FiltroAmostragem(logging.Filter):
+    """
+    Descarta parte dos registros de acesso (os que têm duration_ms) antes de entrarem na fila.
+    Avisos/erros, status >= 400 e requisições lentas são sempre mantidos.
+    """
+
+    def __init__(self, taxa=LOG_SAMPLE_RATE, lento_ms=LOG_SLOW_MS):
+        super().__init__()
+        self.taxa = taxa
+        self.lento_ms = lento_ms
+
+    def filter(self, record):
+        duracao = getattr(record, "duration_ms", None)
+        if duracao is None or record.levelno >= logging.WARNING:
+            return True
+        if (getattr(record, "status", None) or 0) >= 400 or duracao >= self.lento_ms:
+            return True
+        return random.random() < self.taxa
+
+
+class _QueueHandlerLeve(QueueHandler):
+    """QueueHandler que não formata a mensagem na thread da requisição."""
+
+    # Registros descartados porque a fila estava cheia (stdout lento ou travado)
+    descartados = 0
+    _lock_descartados = threading.Lock()
+
+    def enqueue(self, record):
+        # Nunca bloqueia a requisição: se o listener não dá conta, o registro é perdido e contado
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock_descartados:
+                _QueueHandlerLeve.descartados += 1
+
+    def prepare(self, record):
+        # A formatação (JSON, máscara) acontece na thread do listener.
+        # Só resolvemos a exceção aqui, pois o traceback não pode cruzar a fila.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _QueueListenerLimitado(QueueListener):
+    """QueueListener para fila limitada: ao parar, espera vaga para a sentinela em vez de falhar."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+def registros_descartados():
+    """Quantos registros foram perdidos por fila cheia desde que o processo subiu."""
+    return _QueueHandlerLeve.descartados
+
+
+def configurar_logging():
+    """
+    Configura o logger raiz para enviar registros a uma fila consumida por uma thread
+    em segundo plano, que escreve JSON no stdout. Pode ser chamada mais de uma vez.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    fila = queue.Queue(maxsize=LOG_QUEUE_MAX)
+    saida = logging.StreamHandler(sys.stdout)
+    saida.setFormatter(JSONFormatter())
+
+    handler = _QueueHandlerLeve(fila)
+    handler.addFilter(FiltroAmostragem())
+
+    raiz = logging.getLogger()
+    raiz.handlers = [handler]
+    raiz.setLevel(LOG_LEVEL)
+
+    _listener = _QueueListenerLimitado(fila, saida, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
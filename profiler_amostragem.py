@@ -0,0 +1,214 @@
+import os
+import sys
+import math
+import time
+import uuid
+import random
+import threading
+from collections import Counter
+
+# Rotas que podem ser perfiladas por padrão
+ROTAS_PADRAO = ("/proxy/smart-search", "/proxy/api")
+# Limites de segurança para uma sessão iniciada pelo endpoint de admin
+DURACAO_MAX = 600.0
+INTERVALO_MIN = 0.001
+INTERVALO_MAX = 1.0
+# De quanto em quanto tempo cada worker relê a sessão e publica as suas pilhas no store
+INTERVALO_SINCRONIA = 1.0
+# Por quanto tempo o relatório de uma sessão fica disponível depois que ela termina
+RETENCAO_RELATORIO = 3600
+
+CHAVE_SESSAO = "profiler:sessao"
+PREFIXO_PILHAS = "profiler:pilhas:"
+
+
+class ProfilerAmostragem:
+    """
+    Profiler por amostragem: uma thread em segundo plano lê a pilha das threads
+    que estão atendendo requisições marcadas (sys._current_frames) a cada intervalo.
+    Só roda enquanto há uma sessão ativa, então não custa nada fora dela.
+
+    A sessão e as pilhas ficam no store de cache_compartilhado: todo worker do
+    gunicorn enxerga a sessão iniciada por qualquer um deles, publica as suas
+    pilhas periodicamente e o relatório soma as de todos. Com o backend em
+    memória (por processo) o relatório cobre só o worker que respondeu.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._threads = {}
+        self._pilhas = Counter()
+        self._rotulos = {}
+        self._thread = None
+        self._sessao = None
+        self._proxima_sincronia = 0.0
+        self.requisicoes = 0
+
+    # --- Sessão (compartilhada entre os workers) ---
+    def _sessao_atual(self):
+        """Sessão ativa vista por este worker, relida do store no máximo a cada INTERVALO_SINCRONIA."""
+        agora = time.monotonic()
+        if agora >= self._proxima_sincronia:
+            self._proxima_sincronia = agora + INTERVALO_SINCRONIA
+            sessao = self.store.get(CHAVE_SESSAO)
+            with self._lock:
+                if sessao and (self._sessao is None or sessao["id"] != self._sessao["id"]):
+                    # Sessão nova: zera as pilhas locais
+                    self._pilhas.clear()
+                    self.requisicoes = 0
+                self._sessao = sessao
+        sessao = self._sessao
+        if sessao and time.time() < sessao["ate"]:
+            return sessao
+        return None
+
+    def iniciar(self, duracao=30.0, fracao=1.0, rotas=None, intervalo=0.005):
+        """
+        Liga a amostragem em todos os workers por 'duracao' segundos, para uma
+        fração das requisições às rotas dadas.
+        """
+        duracao, fracao, intervalo = float(duracao), float(fracao), float(intervalo)
+        # NaN/Infinity passariam pelos min/max e deixariam a sessão (ou a thread) sem fim
+        if not all(math.isfinite(v) for v in (duracao, fracao, intervalo)):
+            raise ValueError("duracao, fracao e intervalo devem ser números finitos")
+        if duracao <= 0:
+            raise ValueError("duracao deve ser maior que zero")
+        duracao = min(duracao, DURACAO_MAX)
+        sessao = {
+            "id": uuid.uuid4().hex,
+            "inicio": time.time(),
+            "ate": time.time() + duracao,
+            "rotas": sorted(rotas or ROTAS_PADRAO),
+            "fracao": min(max(fracao, 0.0), 1.0),
+            "intervalo": min(max(intervalo, INTERVALO_MIN), INTERVALO_MAX),
+        }
+        self.store.set(CHAVE_SESSAO, sessao, duracao + RETENCAO_RELATORIO)
+        self._proxima_sincronia = 0.0
+        self._sessao_atual()
+        return sessao
+
+    def parar(self):
+        sessao = self.store.get(CHAVE_SESSAO)
+        if sessao:
+            self.store.set(CHAVE_SESSAO, dict(sessao, ate=time.time()), RETENCAO_RELATORIO)
+        self._proxima_sincronia = 0.0
+
+    # --- Marcação das requisições (chamado pelos hooks do Flask) ---
+    def entrar(self, rota):
+        """Marca a thread atual para amostragem se houver sessão ativa e a rota for sorteada."""
+        sessao = self._sessao_atual()
+        if sessao is None or rota not in sessao["rotas"] or random.random() >= sessao["fracao"]:
+            return False
+        self._threads[threading.get_ident()] = rota
+        self.requisicoes += 1
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="profiler-amostragem", daemon=True)
+                self._thread.start()
+        return True
+
+    def sair(self):
+        self._threads.pop(threading.get_ident(), None)
+
+    # --- Coleta ---
+    def _rotulo(self, code):
+        rotulo = self._rotulos.get(code)
+        if rotulo is None:
+            rotulo = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._rotulos[code] = rotulo
+        return rotulo
+
+    def _publicar(self, sessao):
+        """Grava as pilhas acumuladas por este worker no store (substitui a publicação anterior)."""
+        with self._lock:
+            pilhas = {";".join(p): n for p, n in self._pilhas.items()}
+        if pilhas:
+            self.store.set(f"{PREFIXO_PILHAS}{sessao['id']}:{os.getpid()}",
+                           {"pilhas": pilhas, "requisicoes": self.requisicoes}, RETENCAO_RELATORIO)
+
+    def _loop(self):
+        sessao = self._sessao_atual()
+        publicado = time.monotonic()
+        while sessao is not None:
+            frames = sys._current_frames()
+            for tid, rota in list(self._threads.items()):
+                frame = frames.get(tid)
+                pilha = []
+                while frame is not None:
+                    pilha.append(self._rotulo(frame.f_code))
+                    frame = frame.f_back
+                if pilha:
+                    pilha.append(rota)
+                    pilha.reverse()
+                    with self._lock:
+                        self._pilhas[tuple(pilha)] += 1
+            del frames
+            if time.monotonic() - publicado >= INTERVALO_SINCRONIA:
+                self._publicar(sessao)
+                publicado = time.monotonic()
+            time.sleep(sessao["intervalo"])
+            proxima = self._sessao_atual()
+            if proxima is None:
+                # Sessão encerrada: publica o que faltava antes de parar a thread
+                self._publicar(sessao)
+            sessao = proxima
+
+    # --- Relatórios (somam as pilhas de todos os workers) ---
+    def _pilhas_agregadas(self):
+        sessao = self.store.get(CHAVE_SESSAO)
+        pilhas, requisicoes, workers = Counter(), 0, 0
+        if sessao:
+            for chave in self.store.chaves(f"{PREFIXO_PILHAS}{sessao['id']}:"):
+                publicado = self.store.get(chave)
+                if publicado:
+                    pilhas.update(publicado["pilhas"])
+                    requisicoes += publicado["requisicoes"]
+                    workers += 1
+        return sessao, pilhas, requisicoes, workers
+
+    def relatorio_collapsed(self):
+        """Pilhas no formato 'collapsed' (compatível com flamegraph.pl e speedscope)."""
+        _, pilhas, _, _ = self._pilhas_agregadas()
+        return "\n".join(f"{p} {n}" for p, n in pilhas.most_common())
+
+    def top_funcoes(self, limite=30):
+        """
+        Funções com mais amostras: 'proprio' conta quando a função estava no topo da pilha,
+        'total' quando aparecia em qualquer nível (cada pilha conta uma vez por função).
+        """
+        _, pilhas, _, _ = self._pilhas_agregadas()
+        return self._top(pilhas, limite)
+
+    @staticmethod
+    def _top(pilhas, limite):
+        total_amostras = sum(pilhas.values()) or 1
+        proprio, total = Counter(), Counter()
+        for pilha, n in pilhas.items():
+            quadros = pilha.split(";")
+            proprio[quadros[-1]] += n
+            for funcao in set(quadros[1:]):
+                total[funcao] += n
+        return [{
+            "funcao": funcao,
+            "total": n,
+            "proprio": proprio[funcao],
+            "total_pct": round(100 * n / total_amostras, 1),
+            "proprio_pct": round(100 * proprio[funcao] / total_amostras, 1),
+        } for funcao, n in total.most_common(limite)]
+
+    def status(self):
+        sessao, pilhas, requisicoes, workers = self._pilhas_agregadas()
+        if not sessao:
+            return {"ativo": False}
+        return {
+            "ativo": time.time() < sessao["ate"],
+            "restante_s": round(max(sessao["ate"] - time.time(), 0.0), 1),
+            "rotas": sessao["rotas"],
+            "fracao": sessao["fracao"],
+            "intervalo_ms": sessao["intervalo"] * 1000,
+            "inicio": sessao["inicio"],
+            "workers": workers,
+            "requisicoes": requisicoes,
+            "amostras": sum(pilhas.values()),
+        }
@@ -1,13 +1,26 @@
 import os
+import math
+import time
+import hmac
+import hashlib
+import logging
 import requests
 import json
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, g, abort
 from flask_cors import CORS
 from dotenv import load_dotenv
+from log_estruturado import configurar_logging, registros_descartados
+from cache_compartilhado import criar_cache, EsperaEsgotada
+from cache_financeiro import TitulosCompactos
+from profiler_amostragem import ProfilerAmostragem
 
 # Carrega variáveis de ambiente
 load_dotenv()
 
+# Logs estruturados (JSON) com fila em segundo plano e amostragem (ver log_estruturado.py)
+configurar_logging()
+logger = logging.getLogger("proxy")
+
 app = Flask(__name__)
 # Permite CORS de qualquer origem
 CORS(app, resources={r"/*": {"origins": "*"}})
@@ -15,12 +28,73 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 # Configurações Solis
 API_URL = os.getenv("SOLIS_API_URL", "https://academico.faculdadeimes.org.br")
 JWT_TOKEN = os.getenv("SOLIS_JWT_TOKEN")
+# Token exigido (header X-Admin-Token) nas rotas /admin. Sem ele as rotas ficam desativadas.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
 # IDs dos Relatórios
 REPORT_ID_CPF = "6820251203155305"
 REPORT_ID_NOME = "6620251203154311"
 REPORT_ID_DETALHE = "7020251204095501"
 
+# Cache de respostas da Solis (CACHE_BACKEND=sqlite compartilha entre os workers do gunicorn)
+cache = criar_cache()
+# Endpoints de títulos financeiros: no cache em memória ficam em formato compacto (TitulosCompactos)
+ENDPOINTS_TITULOS = {"/api/financeiro/titulo/buscar", "/v1/financial/title"}
+
+def chave_cache(prefixo, *partes):
+    """Gera a chave do cache sem expor CPF/nome em texto puro."""
+    bruto = json.dumps(partes, sort_keys=True, ensure_ascii=False)
+    return f"{prefixo}:{hashlib.sha256(bruto.encode('utf-8')).hexdigest()}"
+
+@app.errorhandler(EsperaEsgotada)
+def espera_esgotada(e):
+    """Outro worker ainda consulta a Solis para a mesma chave: pede para o cliente tentar de novo."""
+    g.cache = "timeout"
+    return jsonify({"error": "Consulta em andamento na Solis. Tente novamente em instantes."}), 503, {"Retry-After": "5"}
+
+# Profiler por amostragem, ligado sob demanda pelas rotas /admin/profiler.
+# Sessão e pilhas ficam no cache, então valem para todos os workers (com CACHE_BACKEND=sqlite/redis).
+profiler = ProfilerAmostragem(cache)
+
+# --- PROFILER ---
+@app.before_request
+def iniciar_profiler():
+    profiler.entrar(request.path)
+
+@app.teardown_request
+def finalizar_profiler(exc=None):
+    profiler.sair()
+
+# --- LOG DE ACESSO ---
+@app.before_request
+def iniciar_log_acesso():
+    g.inicio = time.perf_counter()
+    g.upstream = []
+    g.cache = None
+
+@app.after_request
+def registrar_log_acesso(response):
+    """Registra rota, chamadas à Solis, duração e status de cada requisição (com amostragem)."""
+    inicio = getattr(g, 'inicio', None)
+    if inicio is not None:
+        logger.info("Acesso", extra={
+            "route": request.path,
+            "method": request.method,
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - inicio) * 1000, 1),
+            "upstream": g.upstream,
+            "cache": g.cache,
+        })
+    return response
+
+def registrar_upstream(nome, inicio, status):
+    """Anota uma chamada à Solis feita durante a requisição atual."""
+    g.upstream.append({
+        "endpoint": nome,
+        "status": status,
+        "duration_ms": round((time.perf_counter() - inicio) * 1000, 1),
+    })
+
 # --- ROTA RAIZ (Agora entrega o HTML) ---
 @app.route('/')
 def index():
@@ -36,29 +110,90 @@ def index():
 # --- ROTA DE STATUS (PING) ---
 @app.route('/status', methods=['GET'])
 def server_status():
-    return jsonify({"status": "online", "service": "Solis Proxy"}), 200
+    return jsonify({"status": "online", "service": "Solis Proxy", "logs_descartados": registros_descartados()}), 200
+
+# --- ROTAS DE ADMIN (PROFILER) ---
+def exigir_admin():
+    token = request.headers.get('X-Admin-Token', '')
+    if not ADMIN_TOKEN:
+        abort(404)
+    if not hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        abort(403)
+
+@app.route('/admin/profiler/start', methods=['POST'])
+def profiler_start():
+    """
+    Liga a amostragem sem reiniciar o servidor.
+    Corpo (opcional): {"duracao": 30, "fracao": 1.0, "rotas": ["/proxy/api"], "intervalo_ms": 5}
+    """
+    exigir_admin()
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "O corpo deve ser um objeto JSON."}), 400
+    rotas = data.get('rotas')
+    if rotas is not None and (not isinstance(rotas, list) or not all(isinstance(r, str) for r in rotas)):
+        return jsonify({"error": "'rotas' deve ser uma lista de strings."}), 400
+    try:
+        duracao = float(data.get('duracao', 30))
+        fracao = float(data.get('fracao', 1.0))
+        intervalo_ms = float(data.get('intervalo_ms', 5))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Parâmetros inválidos: {e}"}), 400
+    # O JSON aceita NaN/Infinity: não são durações nem intervalos válidos
+    if not all(math.isfinite(v) for v in (duracao, fracao, intervalo_ms)):
+        return jsonify({"error": "'duracao', 'fracao' e 'intervalo_ms' devem ser números finitos."}), 400
+    if duracao <= 0:
+        return jsonify({"error": "'duracao' deve ser maior que zero."}), 400
+    profiler.iniciar(duracao=duracao, fracao=fracao, rotas=rotas, intervalo=intervalo_ms / 1000)
+    return jsonify(profiler.status())
+
+@app.route('/admin/profiler/stop', methods=['POST'])
+def profiler_stop():
+    exigir_admin()
+    profiler.parar()
+    return jsonify(profiler.status())
+
+@app.route('/admin/profiler/report', methods=['GET'])
+def profiler_report():
+    """
+    ?formato=collapsed devolve as pilhas para flame graph (texto);
+    o padrão devolve status e a tabela das funções mais amostradas.
+    """
+    exigir_admin()
+    if request.args.get('formato') == 'collapsed':
+        return app.response_class(profiler.relatorio_collapsed(), mimetype="text/plain")
+    limite = request.args.get('limite', 30, type=int)
+    return jsonify({"status": profiler.status(), "top": profiler.top_funcoes(limite)})
 
 def execute_report(report_id, params, step_name="Relatório"):
     if not JWT_TOKEN:
-        print(f"❌ [{step_name}] ERRO: Token não configurado.")
+        logger.error("[%s] ERRO: Token não configurado.", step_name)
         return None
 
     url = f"{API_URL}/api/basico/relatorio-generico/gerar/{report_id}"
     payload = { "par": params }
     headers = { "X-Token": JWT_TOKEN, "Content-Type": "application/json" }
     
+    inicio = time.perf_counter()
     try:
         response = requests.get(url, headers=headers, json=payload, timeout=20)
+        registrar_upstream(step_name, inicio, response.status_code)
         if response.status_code == 200:
             try:
                 data = response.json()
                 items = data if isinstance(data, list) else data.get('items', [])
                 return items
             except json.JSONDecodeError:
+                logger.warning("[%s] Resposta da Solis não é JSON válido.", step_name)
                 return None
         else:
+            logger.warning("[%s] Solis retornou status %s.", step_name, response.status_code)
             return None
     except Exception as e:
+        registrar_upstream(step_name, inicio, None)
+        logger.error("[%s] Falha ao consultar a Solis: %s", step_name, e)
         return None
 
 @app.route('/proxy/smart-search', methods=['POST'])
@@ -69,13 +204,24 @@ def smart_search():
     data = request.json
     cpf_input = data.get('cpf', '').replace('.', '').replace('-', '').strip()
     nome_input = data.get('nome', '').strip()
-    aluno_encontrado = None
 
+    aluno_encontrado, g.cache = cache.obter_ou_buscar(
+        chave_cache("busca", cpf_input, nome_input),
+        lambda: buscar_aluno(cpf_input, nome_input),
+        cacheavel=lambda aluno: aluno is not None,
+    )
+    if aluno_encontrado:
+        return jsonify(aluno_encontrado)
+
+    return jsonify({"error": "Aluno não encontrado."}), 404
+
+def buscar_aluno(cpf_input, nome_input):
+    """Executa a busca na Solis (CPF primeiro, depois nome + detalhe). Retorna None se não achar."""
     # 1. Busca por CPF
     if cpf_input:
         res_cpf = execute_report(REPORT_ID_CPF, {"cpf": cpf_input}, step_name="Busca CPF")
         if res_cpf and len(res_cpf) > 0:
-            return jsonify(res_cpf[0])
+            return res_cpf[0]
 
     # 2. Busca por Nome
     if nome_input:
@@ -90,9 +236,9 @@ def smart_search():
                 params_detalhe = { "cod": id_candidato, "id": id_candidato, "ID": id_candidato }
                 res_detalhe = execute_report(REPORT_ID_DETALHE, params_detalhe, step_name="Busca Detalhes ID")
                 if res_detalhe and len(res_detalhe) > 0:
-                    return jsonify(res_detalhe[0])
+                    return res_detalhe[0]
 
-    return jsonify({"error": "Aluno não encontrado."}), 404
+    return None
 
 @app.route('/proxy/api', methods=['POST'])
 def proxy_api():
@@ -102,13 +248,36 @@ def proxy_api():
     url = f"{API_URL}{endpoint}"
     headers = {"X-Token": JWT_TOKEN, "Content-Type": "application/json"}
 
+    def buscar():
+        inicio = time.perf_counter()
+        try:
+            response = requests.get(url, headers=headers, params=params, timeout=20)
+        except Exception:
+            registrar_upstream(endpoint, inicio, None)
+            raise
+        registrar_upstream(endpoint, inicio, response.status_code)
+        if cache.guarda_objetos and response.status_code == 200 and endpoint in ENDPOINTS_TITULOS:
+            titulos = TitulosCompactos.from_json(response.text)
+            if titulos is not None:
+                return {"status": 200, "titulos": titulos}
+        return {"status": response.status_code, "body": response.text}
+
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=20)
-        if response.status_code == 200:
-            return jsonify(response.json())
+        resposta, g.cache = cache.obter_ou_buscar(
+            chave_cache("api", endpoint, params),
+            buscar,
+            cacheavel=lambda r: r["status"] == 200,
+        )
+        if resposta["status"] == 200:
+            # Devolve o JSON da Solis como veio, sem decodificar e re-serializar
+            corpo = resposta["titulos"].to_json() if "titulos" in resposta else resposta["body"]
+            return app.response_class(corpo, mimetype="application/json")
         else:
-            return jsonify({"error": f"Erro Solis: {response.status_code}", "details": response.text}), response.status_code
+            return jsonify({"error": f"Erro Solis: {resposta['status']}", "details": resposta["body"]}), resposta["status"]
+    except EsperaEsgotada:
+        raise
     except Exception as e:
+        logger.error("Falha no proxy para %s: %s", endpoint, e)
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':